@@ -6,104 +6,153 @@ OS Shell Emulator - Вариант №7
 
 import sys
 import os
+import re
 import shlex
 import json
-import zipfile
-import base64
-import yaml
+import time
+from collections import deque
 from datetime import datetime
-from pathlib import Path
+from functools import lru_cache
+
+# ============================================
+# Переменные окружения
+# ============================================
+_ENV_RE = re.compile(r"\$(\w+)")
+_ENV_MAP = {"HOME": os.path.expanduser("~")}
+
+# ============================================
+# Разбор ввода
+# ============================================
+# Символы, при которых ввод разбирается через shlex
+_SHLEX_CHARS = frozenset("'\"\\")
+
+# ============================================
+# Нормализация путей
+# ============================================
+@lru_cache(maxsize=2048)
+def _normalize(cwd, path):
+    """Приводит путь к абсолютному виду относительно cwd (с кэшированием)"""
+    target = path if path.startswith("/") else cwd + "/" + path
+    
+    # Один проход по компонентам пути
+    resolved = []
+    for p in target.split("/"):
+        if not p or p == ".":
+            continue
+        if p == "..":
+            if resolved:
+                resolved.pop()
+        else:
+            resolved.append(p)
+    # Интернированный путь совпадает по identity с ключами VFS.nodes
+    return sys.intern("/" + "/".join(resolved)) if resolved else "/"
 
 # ============================================
 # Класс VFS (Виртуальная файловая система)
 # ============================================
+class VFSError(Exception):
+    """Ошибка операции VFS (сообщение без префикса "Ошибка:")"""
+
 class VFS:
     def __init__(self):
-        self.root = {"type": "dir", "children": {}}
+        self.reset()
+        # Открытый архив: содержимое файлов читается из него по требованию
+        self._zip = None
+    
+    def reset(self):
+        """Сбрасывает дерево VFS к пустому корню"""
+        # Плоское хранилище: абсолютный путь -> узел, путь директории -> имена детей
+        self.nodes = {"/": {"type": "dir"}}
+        self.children = {"/": []}
         self.current_path = "/"
     
+    @staticmethod
+    def child_path(parent, name):
+        """Склеивает путь директории и имя дочернего узла"""
+        return parent + name if parent == "/" else parent + "/" + name
+    
     def normalize_path(self, path):
         """Приводит путь к абсолютному виду внутри VFS"""
-        if path.startswith("/"):
-            target = path
-        else:
-            target = os.path.join(self.current_path, path).rstrip("/")
-        
-        # Упрощённая нормализация
-        parts = [p for p in target.split("/") if p not in ("", ".")]
-        resolved = []
-        for p in parts:
-            if p == "..":
-                if resolved:
-                    resolved.pop()
-            else:
-                resolved.append(p)
-        return "/" + "/".join(resolved) if resolved else "/"
+        return _normalize(self.current_path, path)
     
     def get_node(self, path):
         """Возвращает узел по пути"""
-        path = self.normalize_path(path)
-        if path == "/":
-            return self.root
-        
-        parts = [p for p in path.split("/") if p]
-        node = self.root
-        for part in parts:
-            if part in node.get("children", {}):
-                node = node["children"][part]
-            else:
-                return None
-        return node
+        return self.nodes.get(self.normalize_path(path))
     
     def load_from_zip(self, zip_path):
         """Загружает VFS из ZIP-архива"""
+        import zipfile
         try:
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                for info in zf.infolist():
-                    path = info.filename.rstrip("/")
-                    parts = path.split("/")
-                    
-                    node = self.root
-                    for i, part in enumerate(parts):
-                        if i == len(parts) - 1 and not info.is_dir():
-                            # Файл
-                            content = zf.read(info.filename)
-                            node.setdefault("children", {})[part] = {
-                                "type": "file",
-                                "content": base64.b64encode(content).decode(),
-                                "permissions": 0o644
+            self.close()
+            self.reset()
+            self._zip = zipfile.ZipFile(zip_path, 'r')
+            for info in self._zip.infolist():
+                path = info.filename.rstrip("/")
+                parts = path.split("/")
+                
+                parent = "/"
+                for i, part in enumerate(parts):
+                    part = sys.intern(part)
+                    node_path = sys.intern(self.child_path(parent, part))
+                    if i == len(parts) - 1 and not info.is_dir():
+                        # Файл: запоминаем запись архива, содержимое читается в cat
+                        if node_path not in self.nodes:
+                            self.children[parent].append(part)
+                        self.nodes[parent]["_ls_cache"] = None
+                        self.nodes[node_path] = {
+                            "type": "file",
+                            "zinfo": info,
+                            "content": None,
+                            "permissions": 0o644,
+                            "_perm_str": "644"
+                        }
+                    else:
+                        # Директория
+                        if node_path not in self.nodes:
+                            self.children[parent].append(part)
+                            self.nodes[parent]["_ls_cache"] = None
+                            self.children[node_path] = []
+                            self.nodes[node_path] = {
+                                "type": "dir",
+                                "permissions": 0o755,
+                                "_perm_str": "755"
                             }
-                        else:
-                            # Директория
-                            if part not in node.get("children", {}):
-                                node.setdefault("children", {})[part] = {
-                                    "type": "dir",
-                                    "children": {},
-                                    "permissions": 0o755
-                                }
-                            node = node["children"][part]
+                        parent = node_path
             return True
         except Exception as e:
+            self.close()
+            self.reset()
             print(f"Ошибка загрузки VFS: {e}")
             return False
     
+    def close(self):
+        """Закрывает открытый ZIP-архив"""
+        if self._zip:
+            self._zip.close()
+            self._zip = None
+    
     def list_dir(self, path="."):
         """Список содержимого директории"""
         target = self.normalize_path(path)
         node = self.get_node(target)
         
         if not node:
-            return f"Ошибка: директория '{path}' не найдена"
+            raise VFSError(f"директория '{path}' не найдена")
         if node["type"] != "dir":
-            return f"Ошибка: '{path}' не директория"
+            raise VFSError(f"'{path}' не директория")
+        
+        cached = node.get("_ls_cache")
+        if cached is not None:
+            return cached
         
         items = []
-        for name, child in node.get("children", {}).items():
+        for name in self.children.get(target, ()):
+            child = self.nodes[self.child_path(target, name)]
             typ = "d" if child["type"] == "dir" else "-"
-            perm = oct(child.get("permissions", 0))[-3:]
-            items.append(f"{typ}{perm} {name}")
+            items.append(f"{typ}{child['_perm_str']} {name}")
         
-        return "\n".join(items) if items else "(пусто)"
+        node["_ls_cache"] = "\n".join(items) if items else "(пусто)"
+        return node["_ls_cache"]
     
     def change_dir(self, path):
         """Смена текущей директории"""
@@ -111,9 +160,9 @@ class VFS:
         node = self.get_node(target)
         
         if not node:
-            return f"Ошибка: директория '{path}' не найдена"
+            raise VFSError(f"директория '{path}' не найдена")
         if node["type"] != "dir":
-            return f"Ошибка: '{path}' не директория"
+            raise VFSError(f"'{path}' не директория")
         
         self.current_path = target
         return f"Переход в {target}"
@@ -124,15 +173,18 @@ class VFS:
         node = self.get_node(target)
         
         if not node:
-            return f"Ошибка: файл '{path}' не найден"
+            raise VFSError(f"файл '{path}' не найден")
         if node["type"] != "file":
-            return f"Ошибка: '{path}' не файл"
+            raise VFSError(f"'{path}' не файл")
         
-        content = node.get("content", "")
-        try:
-            return base64.b64decode(content).decode()
-        except:
-            return content
+        if node["content"] is None:
+            # Первое чтение: распаковываем потоково, кусками по 1 МБ
+            buf = bytearray()
+            with self._zip.open(node["zinfo"], 'r') as src:
+                for chunk in iter(lambda: src.read(1 << 20), b""):
+                    buf.extend(chunk)
+            node["content"] = bytes(buf)
+        return node["content"].decode("utf-8", errors="replace")
     
     def chmod(self, mode, path):
         """Изменение прав доступа"""
@@ -140,16 +192,21 @@ class VFS:
         node = self.get_node(target)
         
         if not node:
-            return f"Ошибка: '{path}' не найден"
+            raise VFSError(f"'{path}' не найден")
         
         try:
             # mode может быть строкой "755" или числом
-            if isinstance(mode, str):
-                mode = int(mode, 8)
-            node["permissions"] = mode
-            return f"Правa {oct(mode)} установлены для '{path}'"
+            value = int(mode, 8) if isinstance(mode, str) else mode
         except ValueError:
-            return f"Ошибка: неверный формат прав '{mode}'"
+            raise VFSError(f"неверный формат прав '{mode}'")
+        if not 0 <= value <= 0o7777:
+            raise VFSError(f"неверный формат прав '{mode}'")
+        
+        node["permissions"] = value
+        node["_perm_str"] = format(value & 0o777, "03o")
+        # Сбрасываем кэш ls родительской директории
+        self.nodes[target.rsplit("/", 1)[0] or "/"]["_ls_cache"] = None
+        return f"Правa {oct(value)} установлены для '{path}'"
 
 # ============================================
 # Класс эмулятора (основной)
@@ -159,7 +216,19 @@ class ShellEmulator:
         self.vfs = VFS()
         self.vfs_name = "default_vfs"
         self.running = True
-        self.history = []
+        self.history = deque(maxlen=1000)
+        # Кэш разобранных стартовых скриптов: путь -> список команд
+        self._script_cache = {}
+        # Таблица команд: имя -> обработчик
+        self._dispatch = {
+            "exit": self._cmd_exit,
+            "ls": self._cmd_ls,
+            "cd": self._cmd_cd,
+            "whoami": self._cmd_whoami,
+            "date": self._cmd_date,
+            "cat": self._cmd_cat,
+            "chmod": self._cmd_chmod
+        }
         self.config = {
             "vfs_path": args.get("vfs_path"),
             "log_path": args.get("log_path"),
@@ -167,7 +236,7 @@ class ShellEmulator:
             "config_file": args.get("config_file")
         }
         
-        # Загружаем конфиг из YAML если указан
+        # Загружаем конфиг из YAML/JSON если указан
         if self.config["config_file"] and os.path.exists(self.config["config_file"]):
             self.load_yaml_config()
         
@@ -189,10 +258,16 @@ class ShellEmulator:
             self.run_startup_script()
     
     def load_yaml_config(self):
-        """Загружает конфиг из YAML файла"""
+        """Загружает конфиг из YAML (или JSON) файла"""
         try:
-            with open(self.config["config_file"], 'r') as f:
-                yaml_config = yaml.safe_load(f) or {}
+            config_file = self.config["config_file"]
+            with open(config_file, 'r') as f:
+                if config_file.endswith(".json"):
+                    yaml_config = json.load(f) or {}
+                else:
+                    # PyYAML импортируется только при необходимости
+                    import yaml
+                    yaml_config = yaml.safe_load(f) or {}
             
             # Приоритет: аргументы командной строки > YAML
             for key in ["vfs_path", "log_path", "startup_script"]:
@@ -226,85 +301,123 @@ class ShellEmulator:
         
         print(f"Выполнение стартового скрипта: {script_path}")
         try:
+            program = self._script_cache.get(script_path)
+            if program is not None:
+                for line_num, line, expanded, parts in program:
+                    self._run_script_line(line_num, line, expanded, parts)
+                return
+            
+            # Первый запуск: строки выполняются по мере чтения и попутно кэшируются
+            # как (номер строки, строка, команда после раскрытия, токены)
+            program = []
             with open(script_path, 'r') as f:
                 for line_num, line in enumerate(f, 1):
                     line = line.strip()
                     if not line or line.startswith("#"):
                         continue
-                    
-                    print(f"\n[{line_num}] > {line}")
-                    output = self.execute_command(line)
-                    if output:
-                        print(output)
+                    expanded = self.expand_env_vars(line)
+                    parts = self.parse_input(expanded)
+                    program.append((line_num, line, expanded, parts))
+                    self._run_script_line(line_num, line, expanded, parts)
+            self._script_cache[script_path] = program
         except Exception as e:
             print(f"Ошибка выполнения скрипта: {e}")
     
+    def _run_script_line(self, line_num, line, expanded, parts):
+        """Выполняет одну строку стартового скрипта"""
+        print(f"\n[{line_num}] > {line}")
+        output = self.run_parsed(expanded, parts)
+        if output:
+            print(output)
+    
     def expand_env_vars(self, text):
         """Раскрывает переменные окружения"""
-        if "$HOME" in text:
-            text = text.replace("$HOME", os.path.expanduser("~"))
-        return text
+        return _ENV_RE.sub(lambda m: _ENV_MAP.get(m.group(1), m.group(0)), text)
     
     def parse_input(self, user_input):
         """Парсит ввод пользователя"""
+        # Быстрый путь: без кавычек и экранирования shlex не нужен
+        if _SHLEX_CHARS.isdisjoint(user_input):
+            return user_input.split()
         try:
             return shlex.split(user_input)
-        except:
+        except ValueError:
             return user_input.split()
     
+    def _cmd_exit(self, args):
+        """Команда exit"""
+        self.running = False
+        return "Выход из эмулятора"
+    
+    def _cmd_ls(self, args):
+        """Команда ls"""
+        return self.vfs.list_dir(args[0] if args else ".")
+    
+    def _cmd_cd(self, args):
+        """Команда cd"""
+        return self.vfs.change_dir(args[0] if args else "/")
+    
+    def _cmd_whoami(self, args):
+        """Команда whoami"""
+        return os.getlogin()
+    
+    def _cmd_date(self, args):
+        """Команда date"""
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    def _cmd_cat(self, args):
+        """Команда cat"""
+        if not args:
+            raise VFSError("укажите файл")
+        return self.vfs.cat_file(args[0])
+    
+    def _cmd_chmod(self, args):
+        """Команда chmod"""
+        if len(args) < 2:
+            raise VFSError("chmod MODE FILE")
+        return self.vfs.chmod(args[0], args[1])
+    
     def execute_command(self, user_input):
         """Выполняет одну команду"""
         user_input = self.expand_env_vars(user_input)
-        parts = self.parse_input(user_input)
-        
+        return self.run_parsed(user_input, self.parse_input(user_input))
+    
+    def run_parsed(self, user_input, parts):
+        """Выполняет уже разобранную команду"""
         if not parts:
             return ""
         
-        cmd = parts[0]
+        cmd = sys.intern(parts[0])
         args = parts[1:]
         
-        # Логирование команды
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "command": cmd,
-            "args": args,
-            "error": None
-        }
+        # Запись лога собирается только если задан --log-path
+        log_enabled = bool(self.logger.log_path)
+        started_ns = time.time_ns() if log_enabled else 0
+        error = None
         
         try:
-            if cmd == "exit":
-                self.running = False
-                result = "Выход из эмулятора"
-            elif cmd == "ls":
-                path = args[0] if args else "."
-                result = self.vfs.list_dir(path)
-            elif cmd == "cd":
-                path = args[0] if args else "/"
-                result = self.vfs.change_dir(path)
-            elif cmd == "whoami":
-                result = os.getlogin()
-            elif cmd == "date":
-                result = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            elif cmd == "cat":
-                if not args:
-                    result = "Ошибка: укажите файл"
-                else:
-                    result = self.vfs.cat_file(args[0])
-            elif cmd == "chmod":
-                if len(args) < 2:
-                    result = "Ошибка: chmod MODE FILE"
-                else:
-                    result = self.vfs.chmod(args[0], args[1])
+            handler = self._dispatch.get(cmd)
+            if handler:
+                result = handler(args)
             else:
                 result = f"Ошибка: неизвестная команда '{cmd}'"
-                log_entry["error"] = result
+                error = result
         
+        except VFSError as e:
+            result = f"Ошибка: {e}"
+            error = result
         except Exception as e:
             result = f"Ошибка выполнения: {e}"
-            log_entry["error"] = result
+            error = result
         
         # Сохранение в лог
-        self.logger.log(log_entry)
+        if log_enabled:
+            self.logger.log({
+                "timestamp_ns": started_ns,
+                "command": cmd,
+                "args": args,
+                "error": error
+            })
         self.history.append(user_input)
         
         return result
@@ -316,10 +429,26 @@ class ShellEmulator:
         print("Команды: ls, cd, whoami, date, cat, chmod, exit")
         print("="*50)
         
+        interactive = sys.stdin.isatty()
+        if interactive:
+            try:
+                import readline  # noqa: F401 — история команд и редактирование строки в input()
+            except ImportError:
+                pass  # Нет GNU readline (например, Windows)
+        
         while self.running:
             try:
                 prompt = f"{self.vfs_name} > "
-                user_input = input(prompt).strip()
+                if interactive:
+                    user_input = input(prompt)
+                else:
+                    # Ввод из канала: читаем stdin напрямую, без хуков input()
+                    sys.stdout.write(prompt)
+                    sys.stdout.flush()
+                    user_input = sys.stdin.readline()
+                    if not user_input:
+                        raise EOFError
+                user_input = user_input.strip()
                 
                 if not user_input:
                     continue
@@ -334,6 +463,9 @@ class ShellEmulator:
             except EOFError:
                 print("\nВыход")
                 break
+        
+        self.vfs.close()
+        self.logger.close()
 
 # ============================================
 # Класс логгера
@@ -341,19 +473,36 @@ class ShellEmulator:
 class Logger:
     def __init__(self, log_path=None):
         self.log_path = log_path
-        self.logs = []
+        self.logs = deque(maxlen=10000)
+        # Файл лога открывается один раз и остаётся открытым до close()
+        self._fh = None
+        if log_path:
+            try:
+                self._fh = open(log_path, 'a', buffering=1 << 16)
+            except OSError:
+                pass  # Игнорируем ошибки открытия
     
     def log(self, entry):
         """Добавляет запись в лог"""
         self.logs.append(entry)
         
-        if self.log_path:
+        if self._fh:
             try:
-                with open(self.log_path, 'a') as f:
-                    json.dump(entry, f)
-                    f.write("\n")
+                # Время форматируется только при записи в файл
+                sec, ns = divmod(entry["timestamp_ns"], 10**9)
+                ts = datetime.fromtimestamp(sec).replace(microsecond=ns // 1000)
+                record = {"timestamp": ts.isoformat(), **entry}
+                del record["timestamp_ns"]
+                json.dump(record, self._fh)
+                self._fh.write("\n")
             except:
                 pass  # Игнорируем ошибки записи
+    
+    def close(self):
+        """Сбрасывает буфер и закрывает файл лога"""
+        if self._fh:
+            self._fh.close()
+            self._fh = None
 
 # ============================================
 # Главная функция
@@ -365,7 +514,7 @@ def main():
     parser.add_argument("--vfs-path", help="Путь к VFS (ZIP архив)")
     parser.add_argument("--log-path", help="Путь к лог-файлу")
     parser.add_argument("--startup-script", help="Путь к стартовому скрипту")
-    parser.add_argument("--config-file", help="Путь к конфигурационному файлу YAML")
+    parser.add_argument("--config-file", help="Путь к конфигурационному файлу YAML или JSON")
     
     args = parser.parse_args()
     